@@ -63,6 +63,8 @@ def main(argv=None):
         g_param=args.gitignore,
         output_file=output_file,
         cwd=Path.cwd(),
+        # Token annotations are only worth computing for a terminal.
+        annotate=sys.stdout.isatty(),
     )
 
     # Print discovered ignore files (absolute paths)
@@ -1,20 +1,32 @@
 from __future__ import annotations
+import io
 import os
+import shutil
+import sys
 import time
 import os as _os
 from pathlib import Path
-from typing import List, Tuple, Optional, Dict
-import fnmatch
-from .ignore import build_composite_ignore, CompositeIgnore
+from typing import IO, Callable, Iterator, List, Tuple, Optional, Dict
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathspec import PathSpec
+from .ignore import (
+    build_composite_ignore,
+    CompositeIgnore,
+    default_cache_path,
+    ignore_cache_enabled,
+)
 from .utils import (
-    is_binary_path,
+    ContentCache,
+    is_binary_by_ext,
+    is_binary_by_content,
     read_text_file,
     guess_fence_lang,
     rel_to,
     build_tree,
     top_extensions,
 )
-from .tokenizer import count_tokens
+from .tokenizer import count_tokens, count_tokens_batch
 
 # Default heavy dirs to prune early for speed.
 DEFAULT_PRUNE_DIRS = {
@@ -52,15 +64,196 @@ class Timer:
     def stop(self, name: str) -> float:
         return time.perf_counter() - self.marks.get(name, time.perf_counter())
 
-def matches_any(path_posix: str, patterns: List[str]) -> bool:
-    return any(fnmatch.fnmatch(path_posix, pat) for pat in patterns)
+# Text per count_tokens_batch call: large enough for tiktoken's threads,
+# small enough that texts + token-id lists stay bounded on huge trees.
+_TOKEN_BATCH_CHARS = 8 * 1024 * 1024
+
+# Reading on a thread pool only pays off with several CPUs and enough files
+# to amortize the hand-offs; for a few warm-cache files plain reads win.
+_POOL_MIN_FILES = 256
+
+def count_file_tokens(
+    paths: List[Path],
+    max_file_bytes: int,
+    cache: Optional[ContentCache] = None,
+) -> Dict[Path, Tuple[bool, int]]:
+    """
+    Read every file (respecting the file-size limit) and count its tokens in
+    batched tokenizer calls of about _TOKEN_BATCH_CHARS of text each; only
+    the counts are kept. Contents land in 'cache' for the markdown pass.
+    With more than one CPU and at least _POOL_MIN_FILES files, reads run on
+    a thread pool, one window of files at a time: the read() syscalls
+    release the GIL, so several can be in flight at once.
+    Returns {path: (truncated_flag, tokens)}.
+    """
+    result: Dict[Path, Tuple[bool, int]] = {}
+    batch_paths: List[Path] = []
+    batch: List[Tuple[str, bool]] = []
+    batch_chars = 0
+
+    def flush():
+        nonlocal batch_chars
+        counts, _method = count_tokens_batch([c for c, _t in batch])
+        for p, (_c, t), tok in zip(batch_paths, batch, counts):
+            result[p] = (t, tok)
+        batch_paths.clear()
+        batch.clear()
+        batch_chars = 0
+
+    def add(window: List[Path], items: Iterator[Tuple[str, bool]]):
+        nonlocal batch_chars
+        for p, item in zip(window, items):
+            batch_paths.append(p)
+            batch.append(item)
+            batch_chars += len(item[0])
+            if batch_chars >= _TOKEN_BATCH_CHARS:
+                flush()
+
+    def read(p: Path) -> Tuple[str, bool]:
+        return read_text_file(p, limit_bytes=max_file_bytes, cache=cache)
+
+    cpus = _os.cpu_count() or 1
+    if cpus > 1 and len(paths) >= _POOL_MIN_FILES:
+        workers = min(32, cpus * 4)
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            for start in range(0, len(paths), workers):
+                window = paths[start:start + workers]
+                add(window, ex.map(read, window))
+    else:
+        add(paths, map(read, paths))
+    if batch:
+        flush()
+    return result
+
+# Globs are case-insensitive where the OS is (os.path.normcase), as with
+# fnmatch.fnmatch: patterns and paths are both lowercased there.
+_FOLD_CASE = _os.path.normcase("A") == "a"
+
+def compile_globs(patterns: List[str]) -> Optional[PathSpec]:
+    """
+    Compile include/exclude globs once with gitwildmatch semantics (the same
+    engine as the ignore files), so '**' and '/' behave as in .gitignore.
+    Match against paths passed through _glob_key.
+    Returns None when there are no patterns.
+    """
+    if not patterns:
+        return None
+    if _FOLD_CASE:
+        patterns = [p.lower() for p in patterns]
+    return PathSpec.from_lines("gitwildmatch", patterns)
+
+def _glob_key(rel: str) -> str:
+    return rel.lower() if _FOLD_CASE else rel
+
+# POSIX: descend with openat()/fdopendir() like os.fwalk.
+_FD_WALK = os.scandir in os.supports_fd and os.open in os.supports_dir_fd
+_DIR_OPEN_FLAGS = os.O_RDONLY | getattr(os, "O_DIRECTORY", 0)
+
+def _scan_dir(target) -> Tuple[List[str], List[os.DirEntry]]:
+    """
+    List one directory (path or fd) as (subdirectory names, other entries).
+    Entry types come from the directory listing, not an extra stat per entry.
+    Symlinked directories are dropped: they are never followed.
+    """
+    dirs: List[str] = []
+    files: List[os.DirEntry] = []
+    with os.scandir(target) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.name)
+                    continue
+                if entry.is_symlink() and entry.is_dir():
+                    continue
+            except OSError:
+                pass
+            files.append(entry)
+    return dirs, files
+
+def _walk_fd(
+    root: str,
+    prune: Callable[[str, List[str]], List[str]],
+) -> Iterator[Tuple[str, os.DirEntry, Optional[int]]]:
+    """
+    _walk on POSIX: every directory is opened relative to its parent's fd
+    (O_NOFOLLOW, so a directory swapped for a symlink is not entered), so
+    the kernel never re-resolves the full path. Only ancestors' fds are
+    held open.
+    """
+    try:
+        fd: Optional[int] = os.open(root, _DIR_OPEN_FLAGS)
+    except OSError:
+        return
+    cur = root
+    # (path, fd, names of subdirectories still to visit)
+    frames: List[Tuple[str, int, Iterator[str]]] = []
+    try:
+        while True:
+            if fd is not None:
+                try:
+                    dirs, files = _scan_dir(fd)
+                except OSError:
+                    dirs, files = [], []
+                # Register the fd before prune() runs so 'finally' closes it
+                # even if prune raises.
+                frames.append((cur, fd, iter(())))
+                if dirs:
+                    frames[-1] = (cur, fd, iter(prune(cur, dirs)))
+                for entry in files:
+                    yield os.path.join(cur, entry.name), entry, fd
+            if not frames:
+                return
+            parent, parent_fd, pending = frames[-1]
+            name = next(pending, None)
+            if name is None:
+                frames.pop()
+                os.close(parent_fd)
+                fd = None
+                continue
+            cur = os.path.join(parent, name)
+            try:
+                fd = os.open(name, _DIR_OPEN_FLAGS | getattr(os, "O_NOFOLLOW", 0), dir_fd=parent_fd)
+            except OSError:
+                fd = None
+    finally:
+        for _path, open_fd, _pending in frames:
+            os.close(open_fd)
+
+def _walk(
+    root: str,
+    prune: Callable[[str, List[str]], List[str]],
+) -> Iterator[Tuple[str, os.DirEntry, Optional[int]]]:
+    """
+    Yield (path, entry, dir_fd) for non-directory entries under 'root' in
+    os.walk(topdown=True) order. prune(dir_path, subdir_names) gets all
+    subdirectories of one directory at once and returns the names to
+    descend into; symlinked directories are never followed.
+    dir_fd is the open fd of the entry's directory (POSIX) or None; it is
+    only valid until the next item is requested.
+    Unreadable directories are skipped, like os.walk.
+    """
+    if _FD_WALK:
+        yield from _walk_fd(root, prune)
+        return
+    stack = deque([root])
+    while stack:
+        cur = stack.pop()
+        try:
+            dirs, files = _scan_dir(cur)
+        except OSError:
+            continue
+        kept = prune(cur, dirs) if dirs else []
+        for entry in files:
+            yield entry.path, entry, None
+        # Reversed so the first subdirectory is popped (and walked) first.
+        stack.extend(os.path.join(cur, name) for name in reversed(kept))
 
 def list_included_files(
     root: Path,
     include_globs: List[str],
     exclude_globs: List[str],
     ignore: Optional[CompositeIgnore],
-) -> Tuple[List[Path], List[Path]]:
+) -> Tuple[List[Tuple[str, int]], List[str]]:
     """
     Walk the tree with aggressive pruning:
     - prune directories ignored by .gitignore/.fiignore
@@ -68,112 +261,157 @@ def list_included_files(
     - do not follow symlinked directories
     - apply include/exclude globs on files
     - skip binaries
+    Returns (included, excluded): included as (absolute path, size in bytes)
+    pairs, excluded as absolute paths. Path objects are left to the caller
+    so the hot loop allocates none.
     """
-    included: List[Path] = []
-    excluded: List[Path] = []
+    included: List[Tuple[str, int]] = []
+    excluded: List[str] = []
     root = root.resolve()
+    root_str = str(root)
+    rel_start = len(os.path.join(root_str, ""))
 
     include_hints = _extract_dir_hints(include_globs)
-
-    for cur_dir, dirs, files in os.walk(root, topdown=True, followlinks=False):
-        cur_p = Path(cur_dir)
-
-        # Prune dirs in-place
-        kept: List[str] = []
-        for d in dirs:
-            dp = cur_p / d
-            if d in DEFAULT_PRUNE_DIRS and d not in include_hints:
-                continue
-            if ignore and ignore.matches(dp):
-                continue
-            kept.append(d)
-        dirs[:] = kept
-
-        # Files
-        for name in files:
-            p = cur_p / name
-            if ignore and ignore.matches(p):
-                excluded.append(p)
-                continue
-
-            rel = rel_to(root, p)
-            if include_globs and not matches_any(rel, include_globs):
-                excluded.append(p)
-                continue
-            if exclude_globs and matches_any(rel, exclude_globs):
-                excluded.append(p)
-                continue
-            if is_binary_path(p):
-                excluded.append(p)
-                continue
-            included.append(p)
+    inc_spec = compile_globs(include_globs)
+    exc_spec = compile_globs(exclude_globs)
+
+    def prune(parent: str, names: List[str]) -> List[str]:
+        candidates = [n for n in names if n in include_hints or n not in DEFAULT_PRUNE_DIRS]
+        if ignore and candidates:
+            paths = [os.path.join(parent, n) for n in candidates]
+            kept = set(ignore.filter_dirs(paths))
+            return [n for n, dp in zip(candidates, paths) if dp in kept]
+        return candidates
+
+    for p, entry, dir_fd in _walk(root_str, prune):
+        if ignore and ignore.matches(p):
+            excluded.append(p)
+            continue
+
+        rel = _glob_key(p[rel_start:].replace(os.sep, "/"))
+        if inc_spec and not inc_spec.match_file(rel):
+            excluded.append(p)
+            continue
+        if exc_spec and exc_spec.match_file(rel):
+            excluded.append(p)
+            continue
+        # Known binary extensions decide without opening the file; everything
+        # else gets the NUL probe (catches e.g. UTF-16 .ps1/.txt/.xml).
+        # Entries that are not regular files (broken links, sockets, ...)
+        # cannot be read.
+        if (
+            not entry.is_file()
+            or is_binary_by_ext(p)
+            or is_binary_by_content(entry.name if dir_fd is not None else p, dir_fd=dir_fd)
+        ):
+            excluded.append(p)
+            continue
+        try:
+            size = entry.stat().st_size
+        except OSError:
+            size = 0
+        included.append((p, size))
 
     return included, excluded
 
-def build_markdown(
+_FENCE_END = "\n```\n"
+
+def write_markdown(
     root: Path,
     included: List[Path],
-    excluded: List[Path],
+    excluded: List[str],
     tree_text: str,
     max_file_bytes: int,
     max_total_bytes: int,
-) -> Tuple[str, bool]:
+    out: IO[bytes],
+    cache: Optional[ContentCache] = None,
+    sizes: Optional[List[int]] = None,
+) -> Tuple[bool, str]:
     """
-    Build Markdown; truncate overly large files and stop when total limit reached.
-    Returns (markdown, truncated_flag).
+    Stream Markdown as UTF-8 into 'out'; truncate overly large files and stop
+    when total limit reached. Each piece is encoded exactly once and the byte
+    budget is tracked from the encoded lengths.
+    Returns (truncated_flag, scaffold) where 'scaffold' is the markdown
+    without the file bodies (tree, headers, fences, notes, footer).
+
+    cache: optional ContentCache filled by an earlier pass (count_file_tokens);
+    files found there are not read again.
+    sizes: optional on-disk sizes parallel to 'included'; a file whose size
+    alone cannot fit in the remaining budget ends the output without
+    being read.
 
     No header section at the top.
     Appends a multi-line footer from FASTINGEST_FOOTER; if not set or empty,
     uses the built-in default footer.
     """
-    lines: List[str] = []
+    scaffold: List[str] = []
+
+    def emit(text: str):
+        out.write(text.encode("utf-8", errors="replace"))
+        out.write(b"\n")
+        scaffold.append(text)
+
+    def emit_total_limit_note(header: str):
+        note = "\n[... truncated due to FASTINGEST_MAX_TOTAL_BYTES ...]\n"
+        emit(header)
+        emit("")
+        emit(note.strip())
+        emit("")
 
     # Directory tree (pretty)
-    lines.append("## Directory Tree")
-    lines.append("")
-    lines.append("```text")
-    lines.append(tree_text)
-    lines.append("```")
-    lines.append("")
+    emit("## Directory Tree")
+    emit("")
+    emit("```text")
+    emit(tree_text)
+    emit("```")
+    emit("")
 
     # Files
-    lines.append("## Files")
-    lines.append("")
+    emit("## Files")
+    emit("")
 
     total_bytes = 0
     truncated = False
 
-    for p in included:
+    for idx, p in enumerate(included):
         rel = rel_to(root, p)
         lang = guess_fence_lang(p)
 
         header = f"### `{rel}`"
         block_start = f"```{lang}".rstrip()
+        head = f"{header}\n\n{block_start}\n"
+        head_b = head.encode("utf-8", errors="replace")
 
-        chunk_lines = [header, "", block_start]
+        # Decoding with errors="replace" never shrinks the bytes, so this is
+        # a lower bound of the chunk size.
+        if sizes is not None:
+            approx_add = len(head_b) + min(sizes[idx], max_file_bytes) + len(_FENCE_END)
+            if total_bytes + approx_add > max_total_bytes:
+                emit_total_limit_note(header)
+                truncated = True
+                break
 
-        content, was_truncated = read_text_file(p, limit_bytes=max_file_bytes)
+        content, was_truncated = read_text_file(p, limit_bytes=max_file_bytes, cache=cache)
 
+        note = ""
         if was_truncated:
-            content += "\n\n[... truncated due to FASTINGEST_MAX_FILE_BYTES ...]\n"
-
-        chunk_lines.append(content)
-        chunk_lines.append("```")
-        chunk_lines.append("")
+            note = "\n\n[... truncated due to FASTINGEST_MAX_FILE_BYTES ...]\n"
 
-        chunk_text = "\n".join(chunk_lines)
-        add_len = len(chunk_text.encode("utf-8", errors="replace"))
+        tail = f"{note}{_FENCE_END}"
+        body_b = content.encode("utf-8", errors="replace")
+        tail_b = tail.encode("utf-8", errors="replace")
+        add_len = len(head_b) + len(body_b) + len(tail_b)
 
         if total_bytes + add_len > max_total_bytes:
-            note = "\n[... truncated due to FASTINGEST_MAX_TOTAL_BYTES ...]\n"
-            lines.append(header)
-            lines.append("")
-            lines.append(note.strip())
-            lines.append("")
+            emit_total_limit_note(header)
             truncated = True
             break
 
-        lines.append(chunk_text)
+        out.write(head_b)
+        out.write(body_b)
+        out.write(tail_b)
+        out.write(b"\n")
+        scaffold.append(head + tail)
         total_bytes += add_len
 
     # Footer logic: env or default
@@ -189,9 +427,40 @@ def build_markdown(
         if not footer.endswith("\n"):
             footer += "\n"
 
-    lines.append(footer)
+    out.write(footer.encode("utf-8", errors="replace"))
+    scaffold.append(footer)
+
+    return truncated, "\n".join(scaffold)
 
-    return "\n".join(lines), truncated
+# Characters per slice when streaming UTF-16 into clip.exe (~1 MiB of input).
+_CLIP_CHUNK_CHARS = 1024 * 1024
+
+def _copy_via_pwsh(text: str) -> Optional[str]:
+    """
+    Windows: write text to a UTF-8 temp file and let pwsh load it into the
+    clipboard. Returns the backend name, or None if it failed.
+    """
+    import subprocess
+    import tempfile
+    fd, tmp = tempfile.mkstemp(prefix="fastingest-", suffix=".md")
+    try:
+        with _os.fdopen(fd, "wb") as f:
+            f.write(text.encode("utf-8", errors="replace"))
+        cmd = [
+            "pwsh", "-NoProfile", "-Command",
+            "Set-Clipboard -Value (Get-Content -Raw -Encoding utf8 -Path $env:FI_TMP)",
+        ]
+        env = dict(_os.environ, FI_TMP=tmp)
+        if subprocess.run(cmd, env=env).returncode == 0:
+            return "pwsh Set-Clipboard(utf-8)"
+    except Exception:
+        pass
+    finally:
+        try:
+            _os.unlink(tmp)
+        except OSError:
+            pass
+    return None
 
 def copy_to_clipboard(text: str) -> str:
     """
@@ -206,16 +475,24 @@ def copy_to_clipboard(text: str) -> str:
         pass
 
     import subprocess
-    import sys
     try:
         if sys.platform == "darwin":
             p = subprocess.Popen(["pbcopy"], stdin=subprocess.PIPE)
             p.communicate(input=text.encode("utf-8"))
             return "pbcopy(utf-8)"
         elif sys.platform.startswith("win"):
+            if shutil.which("pwsh"):
+                # PowerShell 7 reads the UTF-8 file itself: no UTF-16 copy here.
+                backend = _copy_via_pwsh(text)
+                if backend:
+                    return backend
             try:
                 p = subprocess.Popen(["clip"], stdin=subprocess.PIPE, shell=True)
-                p.communicate(input=text.encode("utf-16le"))
+                # Encode and pipe in slices instead of one full UTF-16 buffer.
+                for i in range(0, len(text), _CLIP_CHUNK_CHARS):
+                    p.stdin.write(text[i:i + _CLIP_CHUNK_CHARS].encode("utf-16le"))
+                p.stdin.close()
+                p.wait()
                 return "clip(utf-16le)"
             except Exception:
                 cmd = ["powershell", "-NoProfile", "-Command", "Set-Clipboard -Value -"]
@@ -241,7 +518,13 @@ def run_ingest(
     g_param: Optional[str],
     output_file: Optional[Path],
     cwd: Optional[Path] = None,
+    annotate: bool = True,
 ) -> Dict[str, object]:
+    """
+    annotate: build the console trees with per-file token counts (t=N).
+    When False the per-file token pass is skipped entirely; callers that
+    never show the console tree (e.g. redirected output) should pass False.
+    """
     # Limits (env-tunable)
     max_file_bytes = int(_os.environ.get("FASTINGEST_MAX_FILE_BYTES", str(512 * 1024)))         # 512 KiB
     max_total_bytes = int(_os.environ.get("FASTINGEST_MAX_TOTAL_BYTES", str(10 * 1024 * 1024))) # 10 MiB
@@ -263,45 +546,74 @@ def run_ingest(
             ignore_files = [str(p) for p in ignore.all_files]
 
     t.start("scan")
-    included, excluded = list_included_files(directory, include_globs, exclude_globs, ignore)
+    included_sized, excluded = list_included_files(directory, include_globs, exclude_globs, ignore)
+    included = [Path(p) for p, _size in included_sized]
+    sizes = [size for _p, size in included_sized]
+    if ignore is not None and ignore_cache_enabled():
+        ignore.save(default_cache_path(ignore.anchor))
     scan_time = t.stop("scan")
 
     # Prepare per-file token annotations for console tree (respecting file-size limit)
     t.start("per_file_tokens")
-    annotations_rel: Dict[str, str] = {}
-    for p in included:
-        content, was_truncated = read_text_file(p, limit_bytes=max_file_bytes)
-        tok, _method = count_tokens(content)
-        rel = rel_to(directory, p)
-        suffix = f" (t={tok}{'*' if was_truncated else ''})"
-        annotations_rel[rel] = suffix
+    content_cache: Optional[ContentCache] = None
+    file_tokens: Optional[Dict[Path, Tuple[bool, int]]] = None
+    annotations_rel: Optional[Dict[str, str]] = None
+    if annotate:
+        content_cache = ContentCache()
+        file_tokens = count_file_tokens(included, max_file_bytes, content_cache)
+        annotations_rel = {}
+        for p, (was_truncated, tok) in file_tokens.items():
+            rel = rel_to(directory, p)
+            suffix = f" (t={tok}{'*' if was_truncated else ''})"
+            annotations_rel[rel] = suffix
     per_file_tokens_time = t.stop("per_file_tokens")
 
     t.start("tree")
     # For Markdown: pretty unicode, without per-file tokens
     tree_markdown = build_tree(included, directory, charset="unicode")
     # For console: annotated trees (unicode/ascii)
-    tree_console_unicode = build_tree(included, directory, charset="unicode", annotations=annotations_rel)
+    if annotations_rel is None:
+        tree_console_unicode = tree_markdown
+    else:
+        tree_console_unicode = build_tree(included, directory, charset="unicode", annotations=annotations_rel)
     tree_console_ascii = build_tree(included, directory, charset="ascii", annotations=annotations_rel)
     tree_time = t.stop("tree")
 
     t.start("markdown")
-    markdown, was_truncated = build_markdown(
-        directory, included, excluded, tree_markdown, max_file_bytes, max_total_bytes
+    buf = io.BytesIO()
+    was_truncated, scaffold = write_markdown(
+        directory, included, excluded, tree_markdown, max_file_bytes, max_total_bytes, buf, content_cache, sizes
     )
+    # Contents are in 'buf' now; free the cache before the markdown str and
+    # the output/clipboard copies are built.
+    content_cache = None
+    # Decode straight from the buffer (no intermediate bytes copy); the
+    # buffer and the str still coexist until the output file is written.
+    markdown = str(buf.getbuffer(), "utf-8")
     markdown_time = t.stop("markdown")
 
     t.start("tokens")
-    if was_truncated or len(markdown) > 2_000_000:
+    if was_truncated or (file_tokens is None and len(markdown) > 2_000_000):
         token_count, token_method = max(1, int(len(markdown) / 4)), "estimate(~4 chars/token)"
-    else:
+    elif file_tokens is None:
         token_count, token_method = count_tokens(markdown)
+    else:
+        # Every file body is in the markdown: reuse the per-file counts and
+        # only tokenize the surrounding scaffold.
+        token_count, token_method = count_tokens(scaffold)
+        token_count += sum(tok for _t, tok in file_tokens.values())
     tokens_time = t.stop("tokens")
 
     t.start("output")
     if output_file:
         output_file.parent.mkdir(parents=True, exist_ok=True)
-        output_file.write_text(markdown, encoding="utf-8")
+        if _os.linesep == "\n":
+            with output_file.open("wb") as f:
+                f.write(buf.getbuffer())
+        else:
+            # Text mode keeps the platform newlines (CRLF on Windows).
+            output_file.write_text(markdown, encoding="utf-8")
+    buf.close()
     cb_backend = copy_to_clipboard(markdown)
     output_time = t.stop("output")
 
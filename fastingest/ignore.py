@@ -1,11 +1,27 @@
 from __future__ import annotations
 from pathlib import Path
-from typing import List, Tuple, Optional, Dict
+from typing import List, Tuple, Optional, Dict, Union
+import hashlib
 import os
+import json
 from pathspec import PathSpec
 
 IGNORE_FILE_NAMES = [".gitignore", ".fiignore"]
 
+# Bump when the on-disk cache layout or the matching rules change.
+_CACHE_VERSION = 3
+
+def ignore_cache_enabled() -> bool:
+    """
+    Persistent ignore cache is on unless FASTINGEST_IGNORE_CACHE is "0"/"false".
+    """
+    val = os.environ.get("FASTINGEST_IGNORE_CACHE", "").strip().lower()
+    return val not in ("0", "false", "no", "off")
+
+def default_cache_path(anchor: Path) -> Path:
+    digest = hashlib.sha1(str(anchor).encode("utf-8", errors="surrogateescape")).hexdigest()[:16]
+    return Path.home() / ".cache" / "fastingest" / f"{digest}.json"
+
 def _read_lines(file_path: Path) -> List[str]:
     try:
         with file_path.open("r", encoding="utf-8", errors="replace") as f:
@@ -27,23 +43,20 @@ def _normalize_git_line(line: str) -> str:
     - If pattern has no '/', make it recursive by prefixing '**/'
     (Negation '!' is preserved.)
     """
-    neg = False
-    body = line
-    if body.startswith("!"):
-        neg = True
-        body = body[1:]
+    neg = line.startswith("!")
+    body = line[1:] if neg else line
 
     # strip leading './'
     if body.startswith("./"):
         body = body[2:]
 
     # Leading '/' anchors to the ignore file's base; we'll rebase later anyway.
-    body = body.lstrip("/")
+    if body.startswith("/"):
+        body = body.lstrip("/")
 
     if body.endswith("/"):
-        body = body + "**"
-
-    if "/" not in body:
+        body += "**"
+    elif "/" not in body:
         body = "**/" + body
 
     return ("!" + body) if neg else body
@@ -58,26 +71,25 @@ def _common_anchor(dirs: List[Path]) -> Path:
     anc = Path(os.path.commonpath(parts))
     return anc
 
-def _rebase_pattern_to_anchor(pattern: str, base: Path, anchor: Path) -> str:
+def _rebase_prefix(base: Path, anchor: Path) -> str:
     """
-    Convert a pattern relative to 'base' into an anchor-relative one by
-    prefixing the anchor->base relative path.
-    Keep negation '!' as-is.
+    Anchor->base relative path with a trailing '/', or "" if base is the
+    anchor (or, which should not happen, not under it).
     """
-    neg = pattern.startswith("!")
-    body = pattern[1:] if neg else pattern
-
-    prefix = ""
     try:
         rel = base.resolve().relative_to(anchor.resolve()).as_posix()
-        if rel and rel != ".":
-            prefix = rel + "/"
     except Exception:
-        # If base is not under anchor (should not happen), leave prefix empty.
-        prefix = ""
+        return ""
+    return rel + "/" if rel and rel != "." else ""
 
-    rebased = prefix + body
-    return ("!" + rebased) if neg else rebased
+def _rebase_lines(patterns: List[str], prefix: str) -> List[str]:
+    """
+    Prefix every (normalized) pattern with 'prefix', keeping negation '!'.
+    """
+    if not prefix:
+        return patterns
+    neg_prefix = "!" + prefix
+    return [neg_prefix + p[1:] if p.startswith("!") else prefix + p for p in patterns]
 
 class CompositeIgnore:
     """
@@ -88,27 +100,172 @@ class CompositeIgnore:
         self.spec = spec
         self.all_files = all_files
         self.anchor = anchor.resolve()
+        # os.path.join(..., "") adds exactly one trailing separator (even for "/").
+        self._anchor_str = os.path.join(str(self.anchor), "")
         self._cache: Dict[str, bool] = {}
+        # Directories known to be ignored (anchor-relative posix path -> True).
+        # Only ignored ones are kept: while it is empty, _lookup skips the
+        # ancestor scan entirely.
+        self._dir_cache: Dict[str, bool] = {}
+        # Decisions restored by load() that this run has not looked up yet;
+        # they move into _cache on first use and are not saved back.
+        self._saved: Dict[str, bool] = {}
+        self._saved_dirs: Dict[str, bool] = {}
+        self._signature = self._ignore_files_signature()
+        self._persisted_entries = 0
 
-    def matches(self, path: Path) -> bool:
+    def _ignore_files_signature(self) -> List[Tuple[str, int, int]]:
+        sig: List[Tuple[str, int, int]] = []
+        for f in self.all_files:
+            try:
+                st = f.stat()
+                sig.append((str(f), st.st_mtime_ns, st.st_size))
+            except OSError:
+                sig.append((str(f), -1, -1))
+        return sig
+
+    def load(self, cache_path: Path) -> bool:
         """
-        Return True if path should be ignored according to the combined spec.
+        Restore match caches saved by save() if they were built from the same
+        anchor and the same ignore files (paths, mtimes, sizes).
+        Returns True if the caches were restored.
         """
         try:
-            rel = path.resolve().relative_to(self.anchor).as_posix()
+            with cache_path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+            if (
+                data.get("version") != _CACHE_VERSION
+                or data.get("anchor") != str(self.anchor)
+                # JSON has no tuples: compare as lists.
+                or data.get("signature") != [list(s) for s in self._signature]
+            ):
+                return False
+            cache = data["cache"]
+            dir_cache = data["dir_cache"]
+            # Only plain {str: bool} maps are trusted.
+            for m in (cache, dir_cache):
+                if not isinstance(m, dict) or not all(isinstance(v, bool) for v in m.values()):
+                    return False
+            self._saved = cache
+            self._saved_dirs = dir_cache
         except Exception:
+            return False
+        self._persisted_entries = len(cache)
+        return True
+
+    def save(self, cache_path: Path) -> bool:
+        """
+        Persist the decisions looked up since load() together with the
+        ignore-file signature; restored entries this run never needed are
+        dropped, so the file tracks the current tree instead of growing.
+        Skipped when the file would not change.
+        Returns True if the file was written.
+        """
+        if not self._saved and len(self._cache) == self._persisted_entries:
+            return False
+        data = {
+            "version": _CACHE_VERSION,
+            "anchor": str(self.anchor),
+            "signature": self._signature,
+            "cache": self._cache,
+            "dir_cache": self._dir_cache,
+        }
+        tmp = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, cache_path)
+        except Exception:
+            try:
+                tmp.unlink()
+            except Exception:
+                pass
+            return False
+        self._saved = {}
+        self._saved_dirs = {}
+        self._persisted_entries = len(self._cache)
+        return True
+
+    def _relpath(self, path: Union[str, "os.PathLike[str]"]) -> Optional[str]:
+        """
+        Anchor-relative posix path, or None if path is outside of the anchor.
+        """
+        path_str = os.fspath(path)
+        if path_str.startswith(self._anchor_str):
+            # Walk paths are already absolute under the (resolved) anchor:
+            # slice instead of paying for resolve().
+            rel = path_str[len(self._anchor_str):]
+            if os.sep != "/":
+                rel = rel.replace(os.sep, "/")
+            return rel
+        try:
+            return Path(path_str).resolve().relative_to(self.anchor).as_posix()
+        except Exception:
+            return None
+
+    def _lookup(self, rel: str) -> Optional[bool]:
+        """
+        Cached decision for rel, or True if an ancestor directory is known
+        to be ignored; None if the spec has to be consulted.
+        """
+        cached = self._cache.get(rel)
+        if cached is not None:
+            return cached
+        cached = self._saved.pop(rel, None)
+        if cached is not None:
+            self._cache[rel] = cached
+            if self._saved_dirs.pop(rel, False):
+                self._dir_cache[rel] = True
+            return cached
+
+        if self._dir_cache:
+            cut = rel.rfind("/")
+            while cut > 0:
+                if self._dir_cache.get(rel[:cut]):
+                    self._cache[rel] = True
+                    return True
+                cut = rel.rfind("/", 0, cut)
+        return None
+
+    def matches(self, path: Union[str, "os.PathLike[str]"], is_dir: bool = False) -> bool:
+        """
+        Return True if path should be ignored according to the combined spec.
+        Anything below a directory already known to be ignored is ignored
+        without consulting the spec. Pass is_dir=True for directories so
+        their result is remembered for their descendants.
+        """
+        rel = self._relpath(path)
+        if rel is None:
             # Outside of anchor -> cannot be ignored by these specs
             return False
 
-        key = rel
-        cached = self._cache.get(key)
+        cached = self._lookup(rel)
         if cached is not None:
             return cached
 
         val = bool(self.spec.match_file(rel))
-        self._cache[key] = val
+        self._cache[rel] = val
+        if is_dir and val:
+            self._dir_cache[rel] = True
         return val
 
+    def filter_dirs(self, paths: List[str]) -> List[str]:
+        """
+        Return the directories from 'paths' that are not ignored, in order.
+        All uncached ones are checked with a single PathSpec.match_files call
+        and their results are cached. Unlike matches(..., is_dir=True), the
+        dropped directories are not recorded for the ancestor shortcut: the
+        caller prunes them, so their descendants are never looked up.
+        """
+        rels = [self._relpath(p) for p in paths]
+        pending = [r for r in rels if r is not None and self._lookup(r) is None]
+        if pending:
+            hits = set(self.spec.match_files(pending))
+            for r in pending:
+                self._cache[r] = r in hits
+        return [p for p, r in zip(paths, rels) if r is None or not self._cache[r]]
+
 def collect_ignore_files_along_path(start: Path, end: Path) -> List[Path]:
     """
     Collect ignore files on the path from 'start' down to 'end' (inclusive),
@@ -166,6 +323,9 @@ def build_composite_ignore(
 
     Precedence is preserved by concatenating patterns in the collected order
     (top to bottom); deeper rules appear later and override earlier ones.
+
+    Match results saved by an earlier run are restored when the ignore files
+    are unchanged (see ignore_cache_enabled / default_cache_path).
     """
     if g_param is not None and g_param.strip().lower() == "false":
         return None
@@ -191,13 +351,15 @@ def build_composite_ignore(
     # Read, normalize and rebase every pattern into anchor-relative form,
     # then build one combined spec in the same order as 'files'.
     combined_lines: List[str] = []
+    # The anchor->base prefix is resolved once per ignore file, not per line.
     for f in files:
-        base = f.parent
-        raw_lines = _read_lines(f)
-        norm_lines = [_normalize_git_line(s) for s in raw_lines]
-        rebased = [_rebase_pattern_to_anchor(s, base, anchor) for s in norm_lines]
-        combined_lines.extend(rebased)
+        prefix = _rebase_prefix(f.parent, anchor)
+        norm_lines = [_normalize_git_line(s) for s in _read_lines(f)]
+        combined_lines.extend(_rebase_lines(norm_lines, prefix))
 
     # Build one spec using recommended API
     spec = PathSpec.from_lines("gitwildmatch", combined_lines)
-    return CompositeIgnore(spec, files, anchor)
+    ignore = CompositeIgnore(spec, files, anchor)
+    if ignore_cache_enabled():
+        ignore.load(default_cache_path(ignore.anchor))
+    return ignore
@@ -1,4 +1,17 @@
 from __future__ import annotations
+import functools
+import os
+
+_ENCODING_NAME = "cl100k_base"
+
+@functools.lru_cache(maxsize=4)
+def _get_enc(name: str = _ENCODING_NAME):
+    """
+    Load a tiktoken encoder once per process (the merge table is costly).
+    Raises if tiktoken is unavailable; failures are not cached.
+    """
+    import tiktoken  # optional
+    return tiktoken.get_encoding(name)
 
 def count_tokens(text: str) -> tuple[int, str]:
     """
@@ -6,11 +19,23 @@ def count_tokens(text: str) -> tuple[int, str]:
     Returns (count, method).
     """
     try:
-        import tiktoken  # optional
-        enc = tiktoken.get_encoding("cl100k_base")
-        return len(enc.encode(text)), "tiktoken(cl100k_base)"
+        enc = _get_enc()
+        return len(enc.encode(text)), f"tiktoken({_ENCODING_NAME})"
     except Exception:
         # Rough heuristic: ~4 chars per token (common rule of thumb)
         # Count words + punctuation as proxy.
         approx = max(1, int(len(text) / 4))
         return approx, "estimate(~4 chars/token)"
+
+def count_tokens_batch(texts: list[str]) -> tuple[list[int], str]:
+    """
+    Count tokens for many texts in one call; tiktoken encodes the batch on
+    native threads. Same fallback as count_tokens.
+    Returns (counts, method).
+    """
+    try:
+        enc = _get_enc()
+        encoded = enc.encode_ordinary_batch(texts, num_threads=os.cpu_count() or 1)
+        return [len(toks) for toks in encoded], f"tiktoken({_ENCODING_NAME})"
+    except Exception:
+        return [max(1, int(len(t) / 4)) for t in texts], "estimate(~4 chars/token)"
@@ -1,14 +1,18 @@
+import os
+import threading
 from pathlib import Path
-from typing import Iterable, List, Tuple, Dict, Optional
+from typing import Iterable, List, Tuple, Dict, Optional, Union
 
-BINARY_EXTS = {
+PathLike = Union[str, "os.PathLike[str]"]
+
+BINARY_EXTS = frozenset({
     ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".ico", ".webp",
     ".pdf", ".zip", ".rar", ".7z", ".gz", ".tar", ".xz",
     ".mp3", ".wav", ".ogg", ".flac",
     ".mp4", ".mkv", ".mov", ".avi",
     ".woff", ".woff2", ".ttf", ".otf",
     ".dll", ".so", ".dylib", ".exe", ".bin", ".class", ".o",
-}
+})
 
 LANG_BY_EXT = {
     ".py": "python",
@@ -48,23 +52,73 @@ LANG_BY_EXT = {
     ".txt": "",
 }
 
-def is_binary_path(path: Path) -> bool:
-    if path.suffix.lower() in BINARY_EXTS:
+# O_BINARY matters on Windows: no newline translation of the probed bytes.
+_PROBE_OPEN_FLAGS = os.O_RDONLY | getattr(os, "O_BINARY", 0)
+
+def _suffix(path: PathLike) -> str:
+    return os.path.splitext(os.fspath(path))[1].lower()
+
+def is_binary_by_ext(path: PathLike) -> bool:
+    return _suffix(path) in BINARY_EXTS
+
+def is_binary_by_content(path: PathLike, dir_fd: Optional[int] = None) -> bool:
+    """
+    Probe the first 4 KiB for NUL bytes. Unreadable files count as binary.
+    With dir_fd, 'path' is relative to that directory fd (openat), as in os.open.
+    Uses a raw fd (os.open/os.read): no buffered file object for 4 KiB.
+    """
+    try:
+        fd = os.open(path, _PROBE_OPEN_FLAGS, dir_fd=dir_fd)
+    except Exception:
         return True
     try:
-        with path.open("rb") as f:
-            chunk = f.read(4096)
-            if b"\x00" in chunk:
-                return True
+        chunk = os.read(fd, 4096)
     except Exception:
         return True
-    return False
+    finally:
+        os.close(fd)
+    return b"\x00" in chunk
 
-def read_text_file(path: Path, limit_bytes: Optional[int] = None) -> Tuple[str, bool]:
+class ContentCache:
+    """
+    Decoded file contents shared between passes over the same files, so each
+    file is read and decoded once. Bounded by the bytes read from disk; once
+    full, new entries are not admitted. Passes read files in the same order,
+    so keeping the first files (rather than evicting them for the last ones)
+    is what lets the next pass hit. Safe to use from several threads.
+    """
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self._items: Dict[Tuple[str, Optional[int]], Tuple[str, bool]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, Optional[int]]) -> Optional[Tuple[str, bool]]:
+        return self._items.get(key)
+
+    def put(self, key: Tuple[str, Optional[int]], value: Tuple[str, bool], cost: int):
+        with self._lock:
+            if key in self._items or self.used_bytes + cost > self.max_bytes:
+                return
+            self._items[key] = value
+            self.used_bytes += cost
+
+def read_text_file(
+    path: PathLike,
+    limit_bytes: Optional[int] = None,
+    cache: Optional[ContentCache] = None,
+) -> Tuple[str, bool]:
     """
     Read text as UTF-8 (fallback latin-1). If limit_bytes is set, stop after that many bytes.
+    With a cache, a file already read with the same limit is returned from it.
     Returns (text, truncated_flag).
     """
+    if cache is not None:
+        key = (os.fspath(path), limit_bytes)
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
+    path = Path(path)
     data: bytes = b""
     truncated = False
     try:
@@ -93,6 +147,8 @@ def read_text_file(path: Path, limit_bytes: Optional[int] = None) -> Tuple[str,
             text = data.decode("latin-1", errors="replace")
         except Exception:
             text = ""
+    if cache is not None:
+        cache.put(key, (text, truncated), len(data))
     return text, truncated
 
 def guess_fence_lang(path: Path) -> str:
@@ -128,53 +184,45 @@ def build_tree(
     Only directories that contain included files are printed.
     """
     root = root.resolve()
-    parts_map: Dict[Tuple[str, ...], List[str]] = {}
+
+    # Trie of plain strings: node = (subdirs {name: node}, files {name: rel}).
+    tree: Tuple[Dict[str, tuple], Dict[str, str]] = ({}, {})
     for p in paths:
-        rel = Path(rel_to(root, p))
-        if not rel.parts:
+        rel = rel_to(root, p)
+        if not rel or rel == ".":
             continue
-        tup = tuple(rel.parts[:-1])
-        leaf = rel.parts[-1]
-        parts_map.setdefault(tup, []).append(leaf)
-
-    from collections import defaultdict
-    children = defaultdict(set)
-    for tup, leaves in parts_map.items():
-        for i in range(len(tup)):
-            parent = tup[:i]
-            child = tup[:i + 1]
-            children[parent].add(child)
-        children[tup].update({(*tup, leaf) for leaf in sorted(leaves)})
+        *dir_parts, leaf = rel.split("/")
+        node = tree
+        for part in dir_parts:
+            sub = node[0].get(part)
+            if sub is None:
+                sub = node[0][part] = ({}, {})
+            node = sub
+        node[1][leaf] = rel
 
     mid, last, bar = _connectors(charset)
     lines: List[str] = []
 
-    def is_dir_node(node: Tuple[str, ...]) -> bool:
-        return node in children and any(len(g) > len(node) for g in children.get(node, []))
-
-    def render(node: Tuple[str, ...], prefix: str = ""):
-        kids = sorted(children.get(node, []), key=lambda t: (t == node or len(t) == len(node), t))
-        for idx, child in enumerate(kids):
-            is_last = idx == len(kids) - 1
+    def render(node: Tuple[Dict[str, tuple], Dict[str, str]], prefix: str = ""):
+        dirs, files = node
+        names = sorted([*dirs, *files])
+        for idx, name in enumerate(names):
+            is_last = idx == len(names) - 1
             connector = last if is_last else mid
-            next_prefix = prefix + ("    " if is_last else bar)
-            name = child[-1] if child else root.name
-            is_dir = is_dir_node(child)
-            display = name + ("/" if is_dir else "")
+            sub = dirs.get(name)
+            if sub is not None:
+                lines.append(prefix + connector + name + "/")
+                render(sub, prefix + ("    " if is_last else bar))
+                continue
 
+            display = name
             # Append annotation only for file leaves
-            if not is_dir and annotations:
-                rel_key = "/".join(child)
-                suffix = annotations.get(rel_key, "")
-                if suffix:
-                    display += suffix
-
+            if annotations:
+                display += annotations.get(files[name], "")
             lines.append(prefix + connector + display)
-            if is_dir:
-                render(child, next_prefix)
 
     lines.append(root.name + "/")
-    render((), "")
+    render(tree, "")
     return "\n".join(lines)
 
 def top_extensions(files: Iterable[Path], k: int = 5) -> List[Tuple[str, int]]:
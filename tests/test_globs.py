@@ -0,0 +1,61 @@
+import pytest
+
+from fastingest import core
+from fastingest.core import list_included_files
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for rel in (
+        "README.md",
+        "docs/README.md",
+        "docs/guide/intro.md",
+        "src/main.py",
+        "src/pkg/Foo.PY",
+        "src/pkg/util.py",
+        "tests/test_main.py",
+    ):
+        p = tmp_path / rel
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text("x\n", encoding="utf-8")
+    return tmp_path
+
+
+def _included(root, include=(), exclude=()):
+    included, _excluded = list_included_files(root, list(include), list(exclude), None)
+    return sorted(
+        p[len(str(root.resolve())) + 1:].replace("\\", "/") for p, _size in included
+    )
+
+
+@pytest.fixture(params=[False, True], ids=["case-sensitive", "case-folding"])
+def fold_case(request, monkeypatch):
+    monkeypatch.setattr(core, "_FOLD_CASE", request.param)
+    return request.param
+
+
+def test_include_without_slash_matches_at_any_depth(tree, fold_case):
+    assert _included(tree, include=["README.md"]) == ["README.md", "docs/README.md"]
+
+
+def test_exclude_directory_name_drops_subtree(tree, fold_case):
+    assert _included(tree, exclude=["docs"]) == [
+        "README.md", "src/main.py", "src/pkg/Foo.PY", "src/pkg/util.py", "tests/test_main.py",
+    ]
+
+
+def test_include_dir_star_matches_everything_below(tree, fold_case):
+    assert _included(tree, include=["src/*"]) == ["src/main.py", "src/pkg/Foo.PY", "src/pkg/util.py"]
+
+
+def test_double_star_and_anchored_patterns(tree, fold_case):
+    assert _included(tree, include=["docs/**/*.md"]) == ["docs/README.md", "docs/guide/intro.md"]
+    assert _included(tree, include=["/README.md"]) == ["README.md"]
+
+
+def test_case_follows_platform(tree, fold_case):
+    expected = ["src/main.py", "src/pkg/util.py", "tests/test_main.py"]
+    if fold_case:
+        expected.insert(1, "src/pkg/Foo.PY")
+    assert _included(tree, include=["*.py"]) == expected
+    assert _included(tree, include=["*.PY"]) == (expected if fold_case else ["src/pkg/Foo.PY"])
@@ -0,0 +1,85 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from fastingest.ignore import build_composite_ignore, default_cache_path
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.delenv("FASTINGEST_IGNORE_CACHE", raising=False)
+    root = tmp_path / "repo"
+    root.mkdir()
+    (root / ".gitignore").write_text("*.log\n", encoding="utf-8")
+    (root / "a.log").write_text("x", encoding="utf-8")
+    (root / "a.txt").write_text("x", encoding="utf-8")
+    return root
+
+
+def _first_run(root: Path):
+    ignore = build_composite_ignore(root, root, None)
+    assert ignore.matches(root / "a.log")
+    assert not ignore.matches(root / "a.txt")
+    assert ignore.save(default_cache_path(ignore.anchor))
+    return ignore
+
+
+def test_cache_restored_when_ignore_files_unchanged(tree):
+    _first_run(tree)
+    ignore = build_composite_ignore(tree, tree, None)
+    assert ignore._saved == {"a.log": True, "a.txt": False}
+    assert ignore.matches(tree / "a.log")
+    assert ignore._cache == {"a.log": True}
+
+
+def test_stale_cache_discarded_after_ignore_file_edit(tree):
+    first = _first_run(tree)
+    gitignore = tree / ".gitignore"
+    # Same size, different content: only the mtime tells the edit apart.
+    gitignore.write_text("*.txt\n", encoding="utf-8")
+    st = first.all_files[0].stat()
+    os.utime(gitignore, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+    ignore = build_composite_ignore(tree, tree, None)
+    assert ignore._saved == {}
+    assert not ignore.matches(tree / "a.log")
+    assert ignore.matches(tree / "a.txt")
+
+
+def test_cache_disabled_by_env(tree, monkeypatch):
+    _first_run(tree)
+    monkeypatch.setenv("FASTINGEST_IGNORE_CACHE", "0")
+    ignore = build_composite_ignore(tree, tree, None)
+    assert ignore._saved == {}
+
+
+def test_corrupt_cache_is_ignored(tree):
+    first = _first_run(tree)
+    default_cache_path(first.anchor).write_text("{not json", encoding="utf-8")
+    ignore = build_composite_ignore(tree, tree, None)
+    assert ignore._saved == {}
+    assert ignore.matches(tree / "a.log")
+
+
+def test_cache_keeps_only_paths_seen_in_last_run(tree):
+    first = _first_run(tree)
+    path = default_cache_path(first.anchor)
+    for run in range(3):
+        ignore = build_composite_ignore(tree, tree, None)
+        ignore.matches(tree / "a.txt")
+        ignore.matches(tree / f"gen{run}.log")
+        assert ignore.save(path)
+        with path.open(encoding="utf-8") as f:
+            data = json.load(f)
+        assert data["cache"] == {"a.txt": False, f"gen{run}.log": True}
+
+
+def test_unchanged_run_does_not_rewrite_cache(tree):
+    first = _first_run(tree)
+    ignore = build_composite_ignore(tree, tree, None)
+    ignore.matches(tree / "a.log")
+    ignore.matches(tree / "a.txt")
+    assert not ignore.save(default_cache_path(first.anchor))
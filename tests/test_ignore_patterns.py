@@ -0,0 +1,48 @@
+from fastingest.ignore import _normalize_git_line, _rebase_lines, build_composite_ignore
+
+
+def test_normalize_git_line():
+    assert _normalize_git_line("*.log") == "**/*.log"
+    assert _normalize_git_line("build/") == "build/**"
+    assert _normalize_git_line("/dist") == "**/dist"
+    assert _normalize_git_line("./a/b") == "a/b"
+    assert _normalize_git_line("!keep.log") == "!**/keep.log"
+    assert _normalize_git_line("!/x/y/") == "!x/y/**"
+
+
+def test_rebase_lines_keeps_negation():
+    assert _rebase_lines(["**/*.log", "!**/keep.log"], "sub/") == ["sub/**/*.log", "!sub/**/keep.log"]
+    lines = ["a", "!b"]
+    assert _rebase_lines(lines, "") is lines
+
+
+def test_nested_ignore_file_is_rebased_to_anchor(tmp_path, monkeypatch):
+    monkeypatch.setenv("FASTINGEST_IGNORE_CACHE", "0")
+    (tmp_path / ".gitignore").write_text("*.log\n", encoding="utf-8")
+    sub = tmp_path / "sub"
+    sub.mkdir()
+    (sub / ".fiignore").write_text("gen/\n!keep.log\n", encoding="utf-8")
+
+    ignore = build_composite_ignore(sub, tmp_path, None)
+    assert [p.pattern for p in ignore.spec.patterns] == [
+        "**/*.log", "sub/gen/**", "!sub/**/keep.log",
+    ]
+    assert ignore.matches(tmp_path / "x.log")
+    assert ignore.matches(sub / "gen" / "a.py")
+    assert not ignore.matches(sub / "keep.log")
+    assert not ignore.matches(tmp_path / "gen" / "a.py")
+
+
+def test_dir_cache_only_holds_ignored_directories(tmp_path, monkeypatch):
+    monkeypatch.setenv("FASTINGEST_IGNORE_CACHE", "0")
+    (tmp_path / ".gitignore").write_text("build\n", encoding="utf-8")
+    ignore = build_composite_ignore(tmp_path, tmp_path, None)
+
+    kept = ignore.filter_dirs([str(tmp_path / "src"), str(tmp_path / "build")])
+    assert kept == [str(tmp_path / "src")]
+    assert ignore._dir_cache == {}
+
+    assert not ignore.matches(tmp_path / "src", is_dir=True)
+    assert ignore.matches(tmp_path / "out" / "build", is_dir=True)
+    assert ignore._dir_cache == {"out/build": True}
+    assert ignore.matches(tmp_path / "out" / "build" / "keep.txt")
@@ -0,0 +1,33 @@
+from fastingest.utils import build_tree
+
+
+def test_build_tree_sorts_dirs_and_files_together(tmp_path):
+    root = tmp_path / "proj"
+    rels = ["b.py", "a/z.py", "a/b/c.txt", "a.md", "c/d/e/f.txt"]
+    tree = build_tree([root / r for r in rels], root, charset="ascii")
+    assert tree == "\n".join([
+        "proj/",
+        "|-- a/",
+        "|   |-- b/",
+        "|   |   `-- c.txt",
+        "|   `-- z.py",
+        "|-- a.md",
+        "|-- b.py",
+        "`-- c/",
+        "    `-- d/",
+        "        `-- e/",
+        "            `-- f.txt",
+    ])
+
+
+def test_build_tree_annotates_file_leaves_only(tmp_path):
+    root = tmp_path / "proj"
+    paths = [root / "src" / "m.py", root / "README.md"]
+    annotations = {"src/m.py": " (t=5)", "src": " (t=99)"}
+    tree = build_tree(paths, root, charset="unicode", annotations=annotations)
+    assert tree == "\n".join([
+        "proj/",
+        "├── README.md",
+        "└── src/",
+        "    └── m.py (t=5)",
+    ])
@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+from fastingest import core
+from fastingest.core import _walk, list_included_files
+
+needs_fd_walk = pytest.mark.skipif(not core._FD_WALK, reason="fd-relative walk is POSIX only")
+
+
+def _open_fds():
+    return set(os.listdir("/proc/self/fd" if os.path.isdir("/proc/self/fd") else "/dev/fd"))
+
+
+def _keep_all(parent, names):
+    return names
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for rel in ("a.txt", "b/c.txt", "b/d/e.txt", "b/d/f.txt", "g/h.txt", "g/i/j/k.txt", "z.txt"):
+        p = tmp_path / rel
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text("x\n", encoding="utf-8")
+    (tmp_path / "empty").mkdir()
+    return tmp_path
+
+
+def test_order_matches_os_walk(tree):
+    expected = [
+        os.path.join(cur, name)
+        for cur, _dirs, files in os.walk(str(tree), topdown=True)
+        for name in files
+    ]
+    assert [p for p, _entry, _fd in _walk(str(tree), _keep_all)] == expected
+
+
+def test_pruned_directories_are_not_entered(tree):
+    def prune(parent, names):
+        return [n for n in names if n != "d"]
+
+    got = [os.path.relpath(p, tree) for p, _entry, _fd in _walk(str(tree), prune)]
+    assert os.path.join("b", "d", "e.txt") not in got
+    assert os.path.join("b", "c.txt") in got
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="needs symlinks")
+def test_symlinked_directories_are_not_followed(tree, tmp_path_factory):
+    outside = tmp_path_factory.mktemp("outside")
+    (outside / "secret.txt").write_text("x\n", encoding="utf-8")
+    os.symlink(outside, tree / "link", target_is_directory=True)
+    os.symlink(tree / "b", tree / "g" / "loop", target_is_directory=True)
+
+    def parts(p):
+        return set(os.path.relpath(p, tree.resolve()).split(os.sep))
+
+    walked = [p for p, _entry, _fd in _walk(str(tree.resolve()), _keep_all)]
+    assert not any(parts(p) & {"link", "loop"} for p in walked)
+    included, excluded = list_included_files(tree, [], [], None)
+    assert not any(parts(p) & {"link", "loop", "secret.txt"} for p, _size in included)
+    assert not any(parts(p) & {"link", "loop"} for p in excluded)
+
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="needs symlinks")
+def test_broken_symlinks_and_fifos_are_excluded(tree):
+    os.symlink(tree / "missing.txt", tree / "broken.txt")
+    if hasattr(os, "mkfifo"):
+        os.mkfifo(tree / "pipe.txt")
+
+    included, excluded = list_included_files(tree, [], [], None)
+    names = {os.path.basename(p) for p, _size in included}
+    assert "broken.txt" not in names and "pipe.txt" not in names
+    assert str(tree.resolve() / "broken.txt") in excluded
+    if hasattr(os, "mkfifo"):
+        assert str(tree.resolve() / "pipe.txt") in excluded
+
+
+@needs_fd_walk
+def test_no_fds_left_open_after_close_mid_walk(tree):
+    before = _open_fds()
+    it = _walk(str(tree), _keep_all)
+    for p, _entry, _fd in it:
+        if p.endswith("e.txt"):
+            break
+    assert _open_fds() != before
+    it.close()
+    assert _open_fds() == before
+
+
+@needs_fd_walk
+def test_no_fds_left_open_when_prune_raises(tree):
+    def prune(parent, names):
+        if os.path.basename(parent) == "d" or "i" in names:
+            raise RuntimeError("boom")
+        return names
+
+    before = _open_fds()
+    with pytest.raises(RuntimeError):
+        for _ in _walk(str(tree), prune):
+            pass
+    assert _open_fds() == before